@@ -8,16 +8,17 @@ Monitors an Alpicool compatible fridge
 import struct
 import asyncio
 import argparse
+import functools
 import logging
+import signal
 import sys
-import json
 
 from asyncio import Future
 from enum import Enum
 
-from typing import Optional, Union, Callable, Any
+from typing import Optional, Union, Callable, Any, Awaitable, Dict, List
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from bleak import BleakClient, BleakScanner
 from bleak.exc import BleakError
@@ -32,8 +33,34 @@ COMMAND_UUID = '00001235-0000-1000-8000-00805f9b34fb'
 NOTIFY_UID = '1236'
 NOTIFY_UUID = '00001236-0000-1000-8000-00805f9b34fb'
 
+# Fridge header interleaved with unit 1, optionally followed by unit 2
+_FRIDGE_UNIT1 = struct.Struct('>??BBbbbbBBbbbbbBBB')
+_FRIDGE_UNIT2 = struct.Struct('>??BBbbbbBBbbbbbBBBbxxbbbbbb')
+_UNIT1 = struct.Struct('>bxxbxxbbbbb')
+_UNIT2 = struct.Struct('>bxxbbbbbb')
+_SET_NOUNIT2 = struct.Struct('>B??BBbbbbBBbbbb')
+_SET_UNIT2 = struct.Struct('>B??BBbbbbBBbbbbbxxbbbbbxxx')
+_TARGET_CMD = struct.Struct('Bb')
+_CSUM = struct.Struct('>H')
+_UINT8 = struct.Struct('B')
+_INT8 = struct.Struct('b')
+
+# Battery voltage tenths, sized to cover any byte value
+_FRAC10 = tuple(i / 10 for i in range(256))
+
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+except ImportError:
+    import json
+
+    def json_dumps(obj: Any) -> bytes:
+        '''Serialize an object to UTF-8 encoded json'''
+        return json.dumps(obj, separators=(',', ':')).encode()
+else:
+    json_dumps = orjson.dumps  # pylint: disable=no-member
+
 
 class FridgeCommand(int, Enum):
     '''Fridge command codes'''
@@ -69,7 +96,21 @@ class FridgeTemperatureUnit(int, Enum):
     Farenheit = 1
 
 
-@dataclass
+# Enum members indexed by value (all values are contiguous from 0)
+_RUN_MODES = tuple(FridgeRunMode)
+_BATTERY_SAVERS = tuple(FridgeBatterySaver)
+_TEMP_UNITS = (FridgeTemperatureUnit.Celsius, FridgeTemperatureUnit.Fahrenheit)
+
+
+def _lookup_enum(members: tuple, enum_type: type, value: int) -> Any:
+    '''Look up an enum member by value, falling back to the enum for unknown values'''
+    try:
+        return members[value]
+    except IndexError:
+        return enum_type(value)
+
+
+@dataclass(slots=True, frozen=True)
 class FridgeUnitData:
     '''Data for a single fridge unit'''
     # pylint: disable=too-many-instance-attributes
@@ -82,7 +123,7 @@ class FridgeUnitData:
     current_temperature: int
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FridgeData:
     '''Fridge data'''
     # pylint: disable=too-many-instance-attributes
@@ -99,6 +140,7 @@ class FridgeData:
     running_status: Optional[int]
     unit1: FridgeUnitData
     unit2: Optional[FridgeUnitData]
+    raw: bytes = field(default=b'', repr=False, compare=False)
 
     def to_dict(self) -> dict:
         '''Converts fridge data to json dict'''
@@ -127,15 +169,19 @@ class FridgeData:
 
         return info
 
+    def to_json_bytes(self) -> bytes:
+        '''Converts fridge data to UTF-8 encoded json'''
+        return json_dumps(self.to_dict())
 
 
-def decode_unit1_data(data: Union[bytes, bytearray]) -> FridgeUnitData:
+
+def decode_unit1_data(data: Union[bytes, bytearray, memoryview]) -> FridgeUnitData:
     '''Decode the data for unit 1 from packet data'''
     target_temperature, hysteresis, \
     temperature_correction_hot, temperature_correction_mid, \
     temperature_correction_cold, temperature_correction_halt, \
     current_temperature = \
-        struct.unpack_from('>bxxbxxbbbbb', data, 4)
+        _UNIT1.unpack_from(data, 4)
 
     return FridgeUnitData(
         target_temperature = target_temperature,
@@ -148,7 +194,7 @@ def decode_unit1_data(data: Union[bytes, bytearray]) -> FridgeUnitData:
     )
 
 
-def decode_unit2_data(data: Union[bytes, bytearray]) -> Optional[FridgeUnitData]:
+def decode_unit2_data(data: Union[bytes, bytearray, memoryview]) -> Optional[FridgeUnitData]:
     '''Decode the data for unit 2 from packet data'''
     if len(data) < 28:
         return None
@@ -157,7 +203,7 @@ def decode_unit2_data(data: Union[bytes, bytearray]) -> Optional[FridgeUnitData]
     temperature_correction_hot, temperature_correction_mid, \
     temperature_correction_cold, temperature_correction_halt, \
     current_temperature = \
-        struct.unpack_from('>bxxbbbbbb', data, 18)
+        _UNIT2.unpack_from(data, 18)
 
     return FridgeUnitData(
         target_temperature = target_temperature,
@@ -170,85 +216,123 @@ def decode_unit2_data(data: Union[bytes, bytearray]) -> Optional[FridgeUnitData]
     )
 
 
-def decode_fridge_data(data: Union[bytes, bytearray]) -> FridgeData:
+def decode_fridge_data(data: Union[bytes, bytearray, memoryview]) -> FridgeData:
     '''Decode fridge data from packet data'''
+    # pylint: disable=too-many-locals
     if len(data) < 18:
         raise ValueError('Packet too short')
 
+    if len(data) >= 28:
+        fields = _FRIDGE_UNIT2.unpack_from(data, 0)
+    else:
+        fields = _FRIDGE_UNIT1.unpack_from(data, 0)
+
     controls_locked, powered_on, run_mode, battery_saver, \
-    max_selectable_temperature, min_selectable_temperature, \
-    start_delay, temperature_unit, \
+    unit1_target_temperature, max_selectable_temperature, min_selectable_temperature, \
+    unit1_hysteresis, start_delay, temperature_unit, \
+    unit1_temperature_correction_hot, unit1_temperature_correction_mid, \
+    unit1_temperature_correction_cold, unit1_temperature_correction_halt, \
+    unit1_current_temperature, \
     battery_charge_percent, battery_voltage_int, battery_voltage_frac = \
-        struct.unpack_from('>??BBxbbxBBxxxxxBBB', data, 0)
+        fields[:18]
+
+    unit1 = FridgeUnitData(
+        target_temperature = unit1_target_temperature,
+        hysteresis = unit1_hysteresis,
+        temperature_correction_hot = unit1_temperature_correction_hot,
+        temperature_correction_mid = unit1_temperature_correction_mid,
+        temperature_correction_cold = unit1_temperature_correction_cold,
+        temperature_correction_halt = unit1_temperature_correction_halt,
+        current_temperature = unit1_current_temperature
+    )
 
-    running_status = None
+    unit2 = None
 
     if len(data) >= 28:
-        running_status = struct.unpack_from('B', data, 28)
+        # Unit 2 fields are in FridgeUnitData field order
+        unit2 = FridgeUnitData(*fields[18:])
+
+    running_status = data[27] if len(data) >= 28 else None
 
-    battery_voltage = battery_voltage_int + battery_voltage_frac / 10
+    battery_voltage = battery_voltage_int + _FRAC10[battery_voltage_frac]
 
     return FridgeData(
         controls_locked = controls_locked,
         powered_on = powered_on,
-        run_mode = FridgeRunMode(run_mode),
-        battery_saver = FridgeBatterySaver(battery_saver),
+        run_mode = _lookup_enum(_RUN_MODES, FridgeRunMode, run_mode),
+        battery_saver = _lookup_enum(_BATTERY_SAVERS, FridgeBatterySaver, battery_saver),
         max_selectable_temperature = max_selectable_temperature,
         min_selectable_temperature = min_selectable_temperature,
         start_delay = start_delay,
-        temperature_unit = FridgeTemperatureUnit(temperature_unit),
+        temperature_unit = _lookup_enum(_TEMP_UNITS, FridgeTemperatureUnit, temperature_unit),
         battery_charge_percent = battery_charge_percent,
         battery_voltage = battery_voltage,
         running_status = running_status,
-        unit1 = decode_unit1_data(data),
-        unit2 = decode_unit2_data(data)
+        unit1 = unit1,
+        unit2 = unit2,
+        raw = bytes(data)
     )
 
 
 def create_packet(data: bytes) -> bytes:
     '''Create a packet for sending to a fridge'''
-    pkt = b'\xFE\xFE' + struct.pack('B', len(data) + 2) + data
-    pkt += struct.pack('>H', sum(int(v) for v in pkt))
-    return pkt
+    length = len(data)
+    pkt = bytearray(length + 5)
+    pkt[0:2] = b'\xFE\xFE'
+    pkt[2] = length + 2
+    pkt[3:length + 3] = data
+    # The checksum bytes are still zero, so they do not contribute to the sum
+    _CSUM.pack_into(pkt, length + 3, sum(pkt) & 0xFFFF)
+    return bytes(pkt)
+
 
+def get_packet_data(data: Union[bytes, bytearray, memoryview]) -> memoryview:
+    '''Extract the data from a packet
 
-def get_packet_data(data: bytes) -> bytes:
-    '''Extract the data from a packet'''
-    if len(data) <= 2:
+    Returns a view into the packet rather than a copy
+    '''
+    view = memoryview(data)
+
+    if len(view) <= 2:
         raise ValueError('Packet is too small')
 
-    if data[:2] != b'\xFE\xFE':
+    if view[:2] != b'\xFE\xFE':
         raise ValueError('Invalid frame header')
 
-    pktlen = struct.unpack_from('B', data, 2)[0]
+    pktlen = _UINT8.unpack_from(view, 2)[0]
 
-    if pktlen != len(data) - 3:
+    if pktlen != len(view) - 3:
         raise ValueError('Content length does not match')
 
-    csum = struct.unpack_from('>H', data[-2:])[0]
+    csum = _CSUM.unpack_from(view, len(view) - 2)[0]
 
-    if csum != sum(int(v) for v in data[:-2]):
+    if csum != sum(view[:-2]) & 0xFFFF:
         raise ValueError('Invalid checksum')
 
-    return data[3:-2]
+    return view[3:-2]
+
+
+# Packets for commands without arguments never change
+_BIND_PKT = create_packet(_UINT8.pack(FridgeCommand.Bind))
+_QUERY_PKT = create_packet(_UINT8.pack(FridgeCommand.Query))
+_RESET_PKT = create_packet(_UINT8.pack(FridgeCommand.Reset))
 
 
 def encode_bind_command() -> bytes:
     '''Encode a Bind command'''
-    return create_packet(struct.pack('B', FridgeCommand.Bind))
+    return _BIND_PKT
 
 
 def encode_query_command() -> bytes:
     '''Encode a Query command'''
-    return create_packet(struct.pack('B', FridgeCommand.Query))
+    return _QUERY_PKT
 
 
 def encode_set_command(data: FridgeData) -> bytes:
     '''Encode a Set command'''
     # pylint: disable=no-else-return
     if data.unit2 is None:
-        return create_packet(struct.pack(
-            '>B??BBbbbbBBbbbb',
+        return create_packet(_SET_NOUNIT2.pack(
             FridgeCommand.Set,
             data.controls_locked, data.powered_on, data.run_mode, data.battery_saver,
             data.unit1.target_temperature, data.max_selectable_temperature,
@@ -258,8 +342,7 @@ def encode_set_command(data: FridgeData) -> bytes:
             data.unit1.temperature_correction_cold, data.unit1.temperature_correction_halt
         ))
     else:
-        return create_packet(struct.pack(
-            '>B??BBbbbbBBbbbbbxxbbbbbxxx',
+        return create_packet(_SET_UNIT2.pack(
             FridgeCommand.Set,
             data.controls_locked, data.powered_on, data.run_mode, data.battery_saver,
             data.unit1.target_temperature, data.max_selectable_temperature,
@@ -275,17 +358,25 @@ def encode_set_command(data: FridgeData) -> bytes:
 
 def encode_reset_command() -> bytes:
     '''Encode a Reset command'''
-    return create_packet(struct.pack('B', FridgeCommand.Reset))
+    return _RESET_PKT
 
 
+@functools.lru_cache(maxsize=256)
 def encode_set_unit1_target_command(temp: int) -> bytes:
     '''Encode a Set Unit 1 Target Temperature command'''
-    return create_packet(struct.pack('Bb', FridgeCommand.SetUnit1Target, temp))
+    return create_packet(_TARGET_CMD.pack(FridgeCommand.SetUnit1Target, temp))
 
 
+@functools.lru_cache(maxsize=256)
 def encode_set_unit2_target_command(temp: int) -> bytes:
     '''Encode a Set Unit 2 Target Temperature command'''
-    return create_packet(struct.pack('Bb', FridgeCommand.SetUnit2Target, temp))
+    return create_packet(_TARGET_CMD.pack(FridgeCommand.SetUnit2Target, temp))
+
+
+def _set_future_result(future: Optional[Future], result: Any):
+    '''Resolve a command future unless it has already completed or been cancelled'''
+    if future is not None and not future.done():
+        future.set_result(result)
 
 
 class Fridge:
@@ -301,8 +392,10 @@ class Fridge:
     _query_result_future: Optional[Future[FridgeData]] = None
     _set_result_future: Optional[Future[FridgeData]] = None
     _reset_result_future: Optional[Future[FridgeData]] = None
-    _set_unit1_result_future: Optional[Future[FridgeData]] = None
-    _set_unit2_result_future: Optional[Future[FridgeData]] = None
+    _set_unit1_result_future: Optional[Future[int]] = None
+    _set_unit2_result_future: Optional[Future[int]] = None
+    _last_query_data: Optional[FridgeData] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
 
     def __init__(self, client: Union[BleakClient, BLEDevice, str]):
         if isinstance(client, BleakClient):
@@ -310,8 +403,24 @@ class Fridge:
         else:
             self.client = BleakClient(client)
 
+        handlers: Dict[int, Callable[[memoryview], None]] = {
+            FridgeCommand.Bind: self._notify_bind,
+            FridgeCommand.Query: self._notify_query,
+            FridgeCommand.Set: self._notify_set,
+            FridgeCommand.Reset: self._notify_reset,
+            FridgeCommand.SetUnit1Target: self._notify_set_unit1_target_temperature,
+            FridgeCommand.SetUnit2Target: self._notify_set_unit2_target_temperature
+        }
+
+        # Indexed directly by the command byte
+        self._notify_handlers: List[Optional[Callable[[memoryview], None]]] = [
+            handlers.get(cmd) for cmd in range(256)
+        ]
+
     async def connect(self):
         '''Connect to the BLE fridge'''
+        self._loop = asyncio.get_running_loop()
+
         for _ in range(0, 2):
             try:
                 await self.client.connect()
@@ -326,15 +435,18 @@ class Fridge:
         else:
             await self.client.connect()
 
-        for _, c in self.client.services.characteristics.items():
-            if c.service_uuid in (SERVICE_UID, SERVICE_UUID):
-                if c.uuid in (COMMAND_UID, COMMAND_UUID):
-                    self.command_characteristic = c
-                elif c.uuid in (NOTIFY_UID, NOTIFY_UUID):
-                    self.notify_characteristic = c
+        # bleak normalizes short UUIDs, so the lookups also match the short forms
+        service = self.client.services.get_service(SERVICE_UUID)
+
+        if service is None:
+            self.command_characteristic = None
+            self.notify_characteristic = None
+        else:
+            self.command_characteristic = service.get_characteristic(COMMAND_UUID)
+            self.notify_characteristic = service.get_characteristic(NOTIFY_UUID)
 
         if self.command_characteristic is None or self.notify_characteristic is None:
-            self.disconnect()
+            await self.disconnect()
             raise ValueError('Required GATT characteristics not found')
 
         await self.client.start_notify(self.notify_characteristic, self._notify_callback)
@@ -352,145 +464,166 @@ class Fridge:
 
     def _notify_callback(self, sender: BleakGATTCharacteristic, pkt: bytearray):
         '''Callback for BLE notify'''
-        # pylint: disable=unused-argument
+        logger.debug('Recv %s: %s', sender, pkt)
+
+        if len(pkt) > 2 and pkt[:2] == b'\xFE\xFE' and pkt[2] + 3 > len(pkt):
+            logger.warning(
+                'Dropped notification truncated to %d of %d bytes - the MTU may be too small',
+                len(pkt), pkt[2] + 3
+            )
+            return
+
         data = get_packet_data(pkt)
 
         if len(data) < 2:
             return
 
-        cmd = struct.unpack_from('B', data, 0)[0]
-
-        if cmd == FridgeCommand.Bind:
-            self._notify_bind(struct.unpack_from('B', data, 1)[0])
-        elif cmd == FridgeCommand.Query:
-            self._notify_query(decode_fridge_data(data[1:]))
-        elif cmd == FridgeCommand.Set:
-            self._notify_set(decode_fridge_data(data[1:]))
-        elif cmd == FridgeCommand.Reset:
-            self._notify_reset(decode_fridge_data(data[1:]))
-        elif cmd == FridgeCommand.SetUnit1Target:
-            self._notify_set_unit1_target_temperature(struct.unpack_from('b', data, 1)[0])
-        elif cmd == FridgeCommand.SetUnit2Target:
-            self._notify_set_unit2_target_temperature(struct.unpack_from('b', data, 1)[0])
-
-    def _notify_bind(self, data: int):
+        handler = self._notify_handlers[data[0]]
+
+        if handler is not None:
+            handler(data)
+
+    def _decode_query_data(self, data: Union[bytes, bytearray, memoryview]) -> FridgeData:
+        '''Decode Query response data, reusing the last result if it is unchanged'''
+        last_data = self._last_query_data
+
+        if last_data is not None and last_data.raw == data:
+            return last_data
+
+        self._last_query_data = decode_fridge_data(data)
+        return self._last_query_data
+
+    def _notify_bind(self, data: memoryview):
         '''Callback for Bind response'''
-        if isinstance(self._bind_result_future, Future):
-            self._bind_result_future.set_result(data)
+        _set_future_result(self._bind_result_future, _UINT8.unpack_from(data, 1)[0])
 
-    def _notify_query(self, data: FridgeData):
+    def _notify_query(self, data: memoryview):
         '''Callback for Query response'''
+        fridge_data = self._decode_query_data(data[1:])
+
         if self.on_query_response is not None:
-            self.on_query_response(data)
+            self.on_query_response(fridge_data)
 
-        if isinstance(self._query_result_future, Future):
-            self._query_result_future.set_result(data)
+        _set_future_result(self._query_result_future, fridge_data)
 
-    def _notify_set(self, data: FridgeData):
+    def _notify_set(self, data: memoryview):
         '''Callback for Set response'''
-        if isinstance(self._set_result_future, Future):
-            self._set_result_future.set_result(data)
+        _set_future_result(self._set_result_future, decode_fridge_data(data[1:]))
 
-    def _notify_reset(self, data: FridgeData):
+    def _notify_reset(self, data: memoryview):
         '''Callback for Reset response'''
-        if isinstance(self._reset_result_future, Future):
-            self._reset_result_future.set_result(data)
+        _set_future_result(self._reset_result_future, decode_fridge_data(data[1:]))
 
-    def _notify_set_unit1_target_temperature(self, data: int):
+    def _notify_set_unit1_target_temperature(self, data: memoryview):
         '''Callback for Set Unit 1 Target Temperature response'''
-        if isinstance(self._set_unit1_result_future, Future):
-            self._set_unit1_result_future.set_result(data)
+        _set_future_result(self._set_unit1_result_future, _INT8.unpack_from(data, 1)[0])
 
-    def _notify_set_unit2_target_temperature(self, data: int):
+    def _notify_set_unit2_target_temperature(self, data: memoryview):
         '''Callback for Set Unit 2 Target Temperature response'''
-        if isinstance(self._set_unit2_result_future, Future):
-            self._set_unit2_result_future.set_result(data)
-
-    async def _send_command(self, pkt: bytes):
-        '''Send a command to the BLE fridge'''
-        await self.client.write_gatt_char(self.command_characteristic, pkt, response = True)
-
-    async def _send_bind_command(self):
-        '''Send a Bind command'''
-        pkt = encode_bind_command()
-        await self._send_command(pkt)
-
-    async def _send_query_command(self):
-        '''Send a Query command'''
-        pkt = encode_query_command()
-        await self._send_command(pkt)
-
-    async def _send_set_command(self, data: FridgeData):
-        '''Send a Set command'''
-        pkt = encode_set_command(data)
-        await self._send_command(pkt)
-
-    async def _send_reset_command(self):
-        '''Send a Reset command'''
-        pkt = encode_reset_command()
-        await self._send_command(pkt)
-
-    async def _send_set_unit1_target_temperature_command(self, target_temperature: int):
-        '''Send a Set Unit 1 Target Temperature command'''
-        pkt = encode_set_unit1_target_command(target_temperature)
-        await self._send_command(pkt)
-
-    async def _send_set_unit2_target_temperature_command(self, target_temperature: int):
-        '''Send a Set Unit 2 Target Temperature command'''
-        pkt = encode_set_unit2_target_command(target_temperature)
-        await self._send_command(pkt)
+        _set_future_result(self._set_unit2_result_future, _INT8.unpack_from(data, 1)[0])
+
+    def _send_command(self, pkt: bytes) -> Awaitable[None]:
+        '''Send a command to the BLE fridge
+
+        Returns the write coroutine directly rather than wrapping it in
+        another coroutine frame
+        '''
+        logger.debug('Send: %s', pkt)
+        return self.client.write_gatt_char(self.command_characteristic, pkt, response = True)
 
     async def bind(self) -> int:
         '''Send a Bind command and await its response'''
-        loop = asyncio.get_event_loop()
-        self._bind_result_future = loop.create_future()
-        await self._send_bind_command()
+        self._bind_result_future = self._loop.create_future()
+        await self._send_command(encode_bind_command())
         return await self._bind_result_future
 
     async def query(self) -> FridgeData:
         '''Send a Query command and await its response'''
-        loop = asyncio.get_event_loop()
-        self._query_result_future = loop.create_future()
-        await self._send_query_command()
+        self._query_result_future = self._loop.create_future()
+        await self._send_command(encode_query_command())
         return await self._query_result_future
 
     async def set(self, data: FridgeData) -> FridgeData:
         '''Send a Set command and await its response'''
-        loop = asyncio.get_event_loop()
-        self._set_result_future = loop.create_future()
-        await self._send_set_command(data)
+        self._set_result_future = self._loop.create_future()
+        await self._send_command(encode_set_command(data))
         return await self._set_result_future
 
     async def reset(self) -> FridgeData:
         '''Send a Reset command and await its response'''
-        loop = asyncio.get_event_loop()
-        self._reset_result_future = loop.create_future()
-        await self._send_reset_command()
+        self._reset_result_future = self._loop.create_future()
+        await self._send_command(encode_reset_command())
         return await self._reset_result_future
 
     async def set_unit1_target_temperature(self, target_temperature: int) -> int:
         '''Send a Set Unit 1 Target Temperature command and await its response'''
-        loop = asyncio.get_event_loop()
-        self._set_unit1_result_future = loop.create_future()
-        await self._send_set_unit1_target_temperature_command(target_temperature)
+        self._set_unit1_result_future = self._loop.create_future()
+        await self._send_command(encode_set_unit1_target_command(target_temperature))
         return await self._set_unit1_result_future
 
     async def set_unit2_target_temperature(self, target_temperature: int) -> int:
         '''Send a Set Unit 2 Target Temperature command and await its response'''
-        loop = asyncio.get_event_loop()
-        self._set_unit2_result_future = loop.create_future()
-        await self._send_set_unit2_target_temperature_command(target_temperature)
+        self._set_unit2_result_future = self._loop.create_future()
+        await self._send_command(encode_set_unit2_target_command(target_temperature))
         return await self._set_unit2_result_future
 
 
 def print_fridge_data(data: FridgeData):
     '''Dump a JSON representation of the fridge data to standard output'''
-    print(json.dumps(data.to_dict()))
+    sys.stdout.buffer.write(data.to_json_bytes() + b'\n')
+    sys.stdout.buffer.flush()
+
+
+def create_stop_event() -> asyncio.Event:
+    '''Create an event that is set when SIGINT is received
+
+    Only the first SIGINT is caught, so a second one interrupts as usual.
+    Must be called from within the running event loop
+    '''
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def on_sigint():
+        loop.remove_signal_handler(signal.SIGINT)
+        stop.set()
+
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_sigint)
+    except NotImplementedError:
+        # Windows event loops do not support add_signal_handler
+        previous_handler = signal.getsignal(signal.SIGINT)
+
+        def on_sigint_fallback(signum, frame):
+            signal.signal(signal.SIGINT, previous_handler)
+
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(stop.set)
+            elif callable(previous_handler):
+                previous_handler(signum, frame)
+
+        signal.signal(signal.SIGINT, on_sigint_fallback)
+
+    return stop
+
+
+async def wait_for_stop(stop: asyncio.Event, timeout: float) -> bool:
+    '''Wait up to timeout seconds for the stop event
+
+    Returns True if the stop event was set
+    '''
+    try:
+        await asyncio.wait_for(stop.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+
+    return True
 
 
 async def run(addr: str, bind: bool, poll: bool, pollinterval: int):
-    '''Run the write-notify loop'''
-    while True:
+    '''Run the write-notify loop until interrupted'''
+    stop = create_stop_event()
+
+    while not stop.is_set():
         fridge_dev = await BleakScanner.find_device_by_address(addr)
 
         if fridge_dev is None:
@@ -507,15 +640,13 @@ async def run(addr: str, bind: bool, poll: bool, pollinterval: int):
 
             try:
                 await asyncio.wait_for(fridge.query(), 5)
-            except TimeoutError:
+            except asyncio.TimeoutError:
                 pass
 
-            while poll:
-                await asyncio.sleep(pollinterval)
-
+            while poll and not await wait_for_stop(stop, pollinterval):
                 try:
                     await asyncio.wait_for(fridge.query(), 5)
-                except TimeoutError:
+                except asyncio.TimeoutError:
                     pass
 
 
@@ -549,15 +680,21 @@ def main():
         default=10,
         help='Poll interval in seconds (default: 10)'
     )
+    parser.add_argument(
+        '-v',
+        '--verbose',
+        action='store_true',
+        help='Log packets sent to and received from the fridge'
+    )
 
     args = parser.parse_args()
 
     logging.basicConfig()
 
-    try:
-        asyncio.run(run(args.address, args.bind, args.loop, args.pollinterval))
-    except KeyboardInterrupt:
-        sys.stderr.write('Exiting\n')
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+
+    asyncio.run(run(args.address, args.bind, args.loop, args.pollinterval))
 
 
 if __name__ == '__main__':
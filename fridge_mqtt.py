@@ -8,69 +8,132 @@ status updates to an MQTT broker
 
 import asyncio
 import argparse
+import functools
 import logging
-import sys
 
-from typing import Optional
+from typing import List, Optional
+from dataclasses import dataclass
 import paho.mqtt.client as mqtt
 
-from fridge import Fridge, FridgeData
+from fridge import Fridge, FridgeData, create_stop_event, wait_for_stop
 
 
-def publish_offline(mqttc: mqtt.Client, addr: str):
+logger = logging.getLogger(__name__)
+
+_ONLINE_TRUE = b'true'
+_ONLINE_FALSE = b'false'
+
+
+@dataclass
+class Topics:
+    '''MQTT topics for a single fridge'''
+    online: str
+    state: str
+
+    @classmethod
+    def for_address(cls, addr: str) -> 'Topics':
+        '''Build the MQTT topics for the fridge with the given address'''
+        return cls(
+            online = f'fridge/{addr}/online',
+            state = f'fridge/{addr}/state'
+        )
+
+
+async def publish(mqttc: mqtt.Client, topic: str, payload: bytes):
+    '''Publish a retained message from the default executor
+
+    Keeps paho's client lock and socket writes off the event loop thread
+    '''
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(
+        None,
+        functools.partial(mqttc.publish, topic, payload, qos=0, retain=True)
+    )
+
+
+async def publish_offline(mqttc: mqtt.Client, topics: Topics):
     '''Publish online=false to the MQTT broker'''
 
-    mqttc.publish(f"fridge/{addr}/online", False)
+    await publish(mqttc, topics.online, _ONLINE_FALSE)
+
+
+async def publish_status(mqttc: mqtt.Client,
+                         topics: Topics,
+                         data: FridgeData,
+                         previous_signature: Optional[bytes]
+                        ) -> bytes:
+    '''Publish the current fridge status to the MQTT broker if it has changed
+
+    Returns the signature of the data for comparison on the next poll
+    '''
 
+    signature = data.raw
 
-def publish_status(mqttc: mqtt.Client,
-                   addr: str,
-                   data: FridgeData,
-                   previous_data: Optional[FridgeData]
-                  ):
-    '''Publish the current fridge status to the MQTT broker'''
+    if previous_signature is None:
+        await publish(mqttc, topics.online, _ONLINE_TRUE)
 
-    if previous_data is None:
-        mqttc.publish(f"fridge/{addr}/online", True)
+    if signature != previous_signature:
+        await publish(mqttc, topics.state, data.to_json_bytes())
 
-    if previous_data is None or data != previous_data:
-        info = data.to_dict()
+    return signature
 
-        mqttc.publish(f'fridge/{addr}/state', info)
 
+async def monitor(addr: str,
+                  bind: bool,
+                  poll: bool,
+                  pollinterval: int,
+                  mqttc: mqtt.Client,
+                  stop: asyncio.Event
+                 ):
+    '''Run the write-notify loop for a single fridge until stopped'''
+    # pylint: disable=R0801,too-many-arguments,too-many-positional-arguments
+    topics = Topics.for_address(addr)
+    last_signature: Optional[bytes] = None
 
-async def run(addr: str,
+    try:
+        async with Fridge(addr) as fridge:
+            if bind:
+                await asyncio.wait_for(fridge.bind(), 30)
+
+            try:
+                query_response = await asyncio.wait_for(fridge.query(), 5)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                last_signature = await publish_status(mqttc, topics, query_response, None)
+
+            while poll and not await wait_for_stop(stop, pollinterval):
+                try:
+                    query_response = await asyncio.wait_for(fridge.query(), 5)
+                except asyncio.TimeoutError:
+                    if last_signature is not None:
+                        await publish_offline(mqttc, topics)
+                    last_signature = None
+                else:
+                    last_signature = await publish_status(
+                        mqttc, topics, query_response, last_signature
+                    )
+    except Exception:  # pylint: disable=broad-exception-caught
+        # Log now rather than when the other fridges finish, and keep them running
+        logger.exception('Monitoring fridge %s failed', addr)
+    finally:
+        await publish_offline(mqttc, topics)
+
+
+async def run(addrs: List[str],
               bind: bool,
               poll: bool,
               pollinterval: int,
               mqttc: mqtt.Client
              ):
-    '''Run the write-notify loop'''
-    # pylint: disable=R0801
-    async with Fridge(addr) as fridge:
-        if bind:
-            await asyncio.wait_for(fridge.bind(), 30)
+    '''Run the write-notify loop for each fridge until interrupted'''
+    stop = create_stop_event()
 
-        try:
-            query_response = await asyncio.wait_for(fridge.query(), 5)
-        except TimeoutError:
-            pass
-        else:
-            publish_status(mqttc, addr, query_response, None)
-            last_status = query_response
-
-        while poll:
-            await asyncio.sleep(pollinterval)
-
-            try:
-                await asyncio.wait_for(fridge.query(), 5)
-            except TimeoutError:
-                if last_status is not None:
-                    publish_offline(mqttc, addr)
-                last_status = None
-            else:
-                publish_status(mqttc, addr, query_response, last_status)
-                last_status = query_response
+    # Failures are logged by monitor(), this only stops one from cancelling the others
+    await asyncio.gather(
+        *(monitor(addr, bind, poll, pollinterval, mqttc, stop) for addr in addrs),
+        return_exceptions=True
+    )
 
 
 def main():
@@ -78,12 +141,19 @@ def main():
     # pylint: disable=R0801
     parser = argparse.ArgumentParser(
         prog='fridge_mqtt.py',
-        description='Fridge monitor for Alpicool / Brass Monkey fridges'
+        description='Fridge monitor for Alpicool / Brass Monkey fridges',
+        add_help=False
     )
 
     parser.add_argument(
         'address',
-        help='Bluetooth address of fridge'
+        nargs='+',
+        help='Bluetooth address of each fridge'
+    )
+    parser.add_argument(
+        '--help',
+        action='help',
+        help='show this help message and exit'
     )
     parser.add_argument(
         '-b',
@@ -118,23 +188,34 @@ def main():
         default = 1883,
         help='MQTT port'
     )
+    parser.add_argument(
+        '-v',
+        '--verbose',
+        action='store_true',
+        help='Log packets sent to and received from the fridge'
+    )
 
     args = parser.parse_args()
 
     logging.basicConfig()
 
+    if args.verbose:
+        logging.getLogger(Fridge.__module__).setLevel(logging.DEBUG)
+
     mqttc = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
 
+    # A client can only register one will, so it can only cover a single fridge
+    if len(args.address) == 1:
+        topics = Topics.for_address(args.address[0])
+        mqttc.will_set(topics.online, _ONLINE_FALSE, qos=0, retain=True)
+
     mqttc.connect(args.mqtt_host, args.mqtt_port, 60)
 
     mqttc.loop_start()
 
     try:
         asyncio.run(run(args.address, args.bind, args.loop, args.pollinterval, mqttc))
-    except KeyboardInterrupt:
-        sys.stderr.write('Exiting\n')
     finally:
-        publish_offline(mqttc, args.address)
         mqttc.loop_stop()
 
 